@@ -1,14 +1,17 @@
-import json
 import os
-import io
 import csv
+import tempfile
+import threading
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
-from flask import Flask, jsonify, render_template, request, Response
+from flask import Flask, abort, g, jsonify, render_template, request, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from dateutil import parser as date_parser
+import ujson
 
-from summarizer.rules import rules_summarize, infer_intent_from_text, infer_status_from_text
+from summarizer.rules import rules_summarize, infer_intent_from_text, infer_status_from_text, precompute_thread_text
 from summarizer.llm import llm_summarize
 
 APP_ROOT = os.path.dirname(os.path.abspath(__file__))
@@ -18,6 +21,8 @@ TEMPLATES_DIR = os.path.join(APP_ROOT, "templates")
 
 DATASET_PATH = os.path.join(DATA_DIR, "ce_exercise_threads.json")
 APPROVED_SUMMARIES_PATH = os.path.join(DATA_DIR, "approved_summaries.json")
+APPROVALS_LOG_PATH = os.path.join(DATA_DIR, "approved_summaries.jsonl")
+APPROVALS_COMPACTING_PATH = APPROVALS_LOG_PATH + ".compacting"
 CRM_PATH = os.path.join(DATA_DIR, "crm.json")
 PLAYBOOKS_PATH = os.path.join(DATA_DIR, "playbooks.json")
 EXPORT_PATH = os.path.join(DATA_DIR, "approved_export.json")
@@ -28,25 +33,38 @@ def ensure_dirs() -> None:
 def load_json(path: str, default: Any) -> Any:
     if not os.path.exists(path):
         return default
-    with open(path, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return default
+    # One contiguous read; the parser then works on a single bytes buffer
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        return ujson.loads(data)
+    except ValueError:
+        return default
 
 def save_json(path: str, payload: Any) -> None:
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
+    # Write a sibling temp file and swap it in, so unlocked readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            ujson.dump(payload, f, ensure_ascii=False, indent=2, escape_forward_slashes=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
 
-def normalize_thread(raw: Dict[str, Any]) -> Dict[str, Any]:
-    messages = raw.get("messages", [])
-    def ts(m: Dict[str, Any]) -> float:
+def parse_timestamp(value: str) -> float:
+    # Dataset timestamps are ISO-8601; only fall back to dateutil for anything else
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except Exception:
         try:
-            return date_parser.parse(m.get("timestamp", "")).timestamp()
+            return date_parser.parse(value).timestamp()
         except Exception:
             return 0.0
-    messages = sorted(messages, key=ts)
-    return {
+
+def normalize_thread(raw: Dict[str, Any]) -> Dict[str, Any]:
+    messages = sorted(raw.get("messages", []), key=lambda m: parse_timestamp(m.get("timestamp") or ""))
+    return precompute_thread_text({
         "thread_id": raw.get("thread_id"),
         "topic": raw.get("topic"),
         "subject": raw.get("subject"),
@@ -54,28 +72,248 @@ def normalize_thread(raw: Dict[str, Any]) -> Dict[str, Any]:
         "order_id": raw.get("order_id"),
         "product": raw.get("product"),
         "messages": messages,
-    }
+    })
+
+_FileVersion = Optional[Tuple[int, int]]
+
+def _file_version(path: str) -> _FileVersion:
+    # Cache key for a data file: nanosecond mtime plus size, so rewrites or appends
+    # within one coarse mtime tick still register as a change
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
 
-def get_crm_profile(order_id: str) -> Dict[str, Any]:
+@lru_cache(maxsize=1)
+def _crm_index(crm_version: _FileVersion) -> Dict[str, Dict[str, Any]]:
     crm = load_json(CRM_PATH, default={"customers": []})
-    for c in crm.get("customers", []):
-        if order_id in c.get("orders", []):
-            return {
-                "customer_id": c.get("customer_id"),
-                "tier": c.get("tier"),
-                "entitlements": c.get("entitlements", []),
-                "shipping_restrictions": c.get("shipping_constraints", []),
-                "shipping_constraints": c.get("shipping_constraints", [])
-            }
+    # Reversed so the first customer listing an order wins, as with a linear scan
+    return {oid: c for c in reversed(crm.get("customers", [])) for oid in c.get("orders", [])}
+
+# Shared defaults for threads without a CRM match; never mutated
+_EMPTY: Tuple[()] = ()
+_DEFAULT_CRM_PROFILE: Dict[str, Any] = {
+    "customer_id": None,
+    "tier": "Standard",
+    "entitlements": _EMPTY,
+    "shipping_restrictions": _EMPTY,
+    "shipping_constraints": _EMPTY
+}
+
+def get_crm_profile(order_id: Optional[str]) -> Dict[str, Any]:
+    if not order_id:
+        return _DEFAULT_CRM_PROFILE
+    c = _crm_index(_file_version(CRM_PATH)).get(order_id)
+    if c is None:
+        return _DEFAULT_CRM_PROFILE
     return {
-        "customer_id": None,
-        "tier": "Standard",
-        "entitlements": [],
-        "shipping_restrictions": [],
-        "shipping_constraints": []
+        "customer_id": c.get("customer_id"),
+        "tier": c.get("tier"),
+        "entitlements": c.get("entitlements", _EMPTY),
+        "shipping_restrictions": c.get("shipping_constraints", _EMPTY),
+        "shipping_constraints": c.get("shipping_constraints", _EMPTY)
     }
 
+_CSV_HEADER = (
+    "thread_id", "order_id", "product",
+    "intent", "status", "approved_summary", "approved_intent", "approved_status",
+    "customer_id", "customer_tier", "entitlements", "shipping_constraints",
+    "engine_used", "edit_distance"
+)
+
+def _csv_row(t: Dict[str, Any], appr: Dict[str, Any]) -> Tuple[Any, ...]:
+    # One export_csv row, in _CSV_HEADER order, for a summarized thread
+    ai = t["ai_summary"]
+    crm_info = t["crm_profile"]
+    return (
+        t.get("thread_id"),
+        t.get("order_id"),
+        t.get("product"),
+        ai.get("intent"),
+        ai.get("status"),
+        (appr.get("approved_summary") or "").replace("\n", " ").strip(),
+        appr.get("approved_intent"),
+        appr.get("approved_status"),
+        crm_info.get("customer_id"),
+        crm_info.get("tier"),
+        ";".join(crm_info.get("entitlements", _EMPTY)),
+        ";".join(crm_info.get("shipping_constraints", _EMPTY)),
+        appr.get("engine_used", ""),
+        appr.get("edit_distance", "")
+    )
+
+def _summarize_one(raw: Dict[str, Any]) -> Dict[str, Any]:
+    t = normalize_thread(raw)
+    ai = rules_summarize(t)
+    crm_info = get_crm_profile(t.get("order_id"))
+    # Without a CRM match the summary's own crm_context defaults already apply
+    if crm_info is not _DEFAULT_CRM_PROFILE:
+        ai["crm_context"].update({
+            "customer_tier": crm_info["tier"],
+            "entitlements": crm_info["entitlements"],
+            "shipping_constraints": crm_info["shipping_constraints"],
+            "customer_id": crm_info["customer_id"],
+        })
+    # t is a fresh dict from normalize_thread, so enrich it in place
+    t["ai_summary"] = ai
+    t["crm_profile"] = crm_info
+    # Flat CSV export row for the unapproved case, reused by export_csv as-is
+    t["_csv_row"] = _csv_row(t, {})
+    return t
+
+@lru_cache(maxsize=1)
+def _threads_with_summaries(dataset_version: _FileVersion, crm_version: _FileVersion) -> List[Dict[str, Any]]:
+    # The versions are only the cache key; editing either file yields a new key.
+    raw_threads = load_json(DATASET_PATH, default={"threads": []}).get("threads", [])
+    return [_summarize_one(r) for r in raw_threads]
+
+def load_threads_with_summaries() -> List[Dict[str, Any]]:
+    """
+    Normalized threads joined with their rules summary ("ai_summary") and CRM profile.
+    Cached until the dataset or CRM file changes on disk; treat the result as read-only.
+    """
+    return _threads_with_summaries(_file_version(DATASET_PATH), _file_version(CRM_PATH))
+
+def _export_record(t: Dict[str, Any], appr: Dict[str, Any]) -> Dict[str, Any]:
+    crm_info = t["crm_profile"]
+    rules_info = t["ai_summary"]
+    return {
+        "thread_id": t.get("thread_id"),
+        "order_id": t.get("order_id"),
+        "product": t.get("product"),
+        "intent": rules_info.get("intent"),
+        "status": rules_info.get("status"),
+        "approved_summary": appr.get("approved_summary"),
+        "approved_intent": appr.get("approved_intent"),
+        "approved_status": appr.get("approved_status"),
+        "customer_id": crm_info.get("customer_id"),
+        "customer_tier": crm_info.get("tier"),
+        "entitlements": crm_info.get("entitlements"),
+        "shipping_constraints": crm_info.get("shipping_constraints"),
+    }
+
+# Approvals are appended here one JSON line at a time; /admin/compact folds them
+# into APPROVED_SUMMARIES_PATH. EXPORT_PATH is regenerated when an export is requested.
+_approvals_lock = threading.Lock()
+
+def _replay_log(path: str, approvals: Dict[str, Any]) -> None:
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                entry = ujson.loads(line)
+            except ValueError:
+                continue  # blank or torn trailing line
+            approvals[entry["thread_id"]] = entry["approval"]
+
+@lru_cache(maxsize=1)
+def _approvals_view(snapshot_version: _FileVersion, compacting_version: _FileVersion,
+                    log_version: _FileVersion) -> Dict[str, Any]:
+    approvals = load_json(APPROVED_SUMMARIES_PATH, default={})
+    # A log moved aside by a compaction in progress is older than the live log
+    _replay_log(APPROVALS_COMPACTING_PATH, approvals)
+    _replay_log(APPROVALS_LOG_PATH, approvals)
+    return approvals
+
+def load_approvals() -> Dict[str, Any]:
+    """
+    Approvals by thread_id: the compacted snapshot with the append-only log replayed on top.
+    Cached until any of the files change; treat the result as read-only.
+    """
+    return _approvals_view(_file_version(APPROVED_SUMMARIES_PATH),
+                           _file_version(APPROVALS_COMPACTING_PATH),
+                           _file_version(APPROVALS_LOG_PATH))
+
+def persist_approval(thread_id: str, record: Dict[str, Any]) -> None:
+    """Appends a single approval to the log; nothing else is rewritten."""
+    ensure_dirs()
+    line = ujson.dumps({"thread_id": thread_id, "approval": record},
+                       ensure_ascii=False, escape_forward_slashes=False)
+    with _approvals_lock:
+        with open(APPROVALS_LOG_PATH, "ab") as f:
+            f.write(line.encode("utf-8") + b"\n")
+
+def compact_approvals() -> Dict[str, Any]:
+    """
+    Folds the approvals log into APPROVED_SUMMARIES_PATH and regenerates EXPORT_PATH.
+    The log is moved aside before it is read, so lines appended meanwhile (possibly by
+    another process) go to a fresh log instead of being lost.
+    """
+    ensure_dirs()
+    with _approvals_lock:
+        # A file left by an interrupted compaction is folded first; the live log waits for the next run
+        if not os.path.exists(APPROVALS_COMPACTING_PATH) and os.path.exists(APPROVALS_LOG_PATH):
+            os.replace(APPROVALS_LOG_PATH, APPROVALS_COMPACTING_PATH)
+        approvals = load_json(APPROVED_SUMMARIES_PATH, default={})
+        _replay_log(APPROVALS_COMPACTING_PATH, approvals)
+        save_json(APPROVED_SUMMARIES_PATH, approvals)
+        if os.path.exists(APPROVALS_COMPACTING_PATH):
+            os.remove(APPROVALS_COMPACTING_PATH)
+    refresh_export(load_threads_with_summaries(), load_approvals())
+    return approvals
+
+# Snapshots EXPORT_PATH was last written from
+_export_sources: Dict[str, Any] = {"threads": None, "approvals": None}
+
+def refresh_export(threads: List[Dict[str, Any]], approvals: Dict[str, Any]) -> None:
+    """
+    Rewrites the denormalized EXPORT_PATH unless it was already written from these
+    cached threads and approvals snapshots.
+    """
+    if (_export_sources["threads"] is threads and _export_sources["approvals"] is approvals
+            and os.path.exists(EXPORT_PATH)):
+        return
+    ensure_dirs()
+    save_json(EXPORT_PATH, [_export_record(t, approvals.get(t.get("thread_id"), {})) for t in threads])
+    _export_sources["threads"] = threads
+    _export_sources["approvals"] = approvals
+
+class UJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by ujson, used by jsonify and request.get_json."""
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        kwargs.setdefault("default", self.default)
+        kwargs.setdefault("ensure_ascii", self.ensure_ascii)
+        kwargs.setdefault("sort_keys", self.sort_keys)
+        kwargs.setdefault("escape_forward_slashes", False)
+        return ujson.dumps(obj, **kwargs)
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        return ujson.loads(s, **kwargs)
+
+@lru_cache(maxsize=1)
+def _threads_by_id(dataset_version: _FileVersion, crm_version: _FileVersion) -> Dict[str, Dict[str, Any]]:
+    # Reversed so the first thread with a given id wins, as with a linear scan
+    return {t.get("thread_id"): t for t in reversed(_threads_with_summaries(dataset_version, crm_version))}
+
+def get_thread(thread_id: Any) -> Optional[Dict[str, Any]]:
+    """Single summarized thread by id, served from the same cache as load_threads_with_summaries()."""
+    # Ids come straight from request JSON; anything but a string can't match
+    if not isinstance(thread_id, str):
+        return None
+    return _threads_by_id(_file_version(DATASET_PATH), _file_version(CRM_PATH)).get(thread_id)
+
 app = Flask(__name__, static_folder=STATIC_DIR, template_folder=TEMPLATES_DIR)
+app.json = UJSONProvider(app)
+
+def _request_json() -> Any:
+    # Parse the raw body with ujson directly, skipping Werkzeug's mimetype checks
+    try:
+        return ujson.loads(request.get_data(cache=False))
+    except ValueError:
+        abort(400, description="Failed to decode JSON object")
+
+# Request-scoped memo on top of the process-wide caches: one fetch per request
+def _get_threads() -> List[Dict[str, Any]]:
+    if not hasattr(g, "_threads"):
+        g._threads = load_threads_with_summaries()
+    return g._threads
+
+def _get_approvals() -> Dict[str, Any]:
+    if not hasattr(g, "_approvals"):
+        g._approvals = load_approvals()
+    return g._approvals
 
 @app.get("/")
 def index():
@@ -83,26 +321,15 @@ def index():
 
 @app.get("/api/threads")
 def api_threads():
-    raw = load_json(DATASET_PATH, default={"threads": []})
-    threads = [normalize_thread(t) for t in raw.get("threads", [])]
-    approvals = load_json(APPROVED_SUMMARIES_PATH, default={})
+    threads = _get_threads()
+    approvals = _get_approvals()
     
     thread_list = []
     for t in threads:
         tid = t.get("thread_id")
         appr = approvals.get(tid)
-        
-        # Determine current state / summary
-        summary_info = rules_summarize(t)
-        crm_info = get_crm_profile(t.get("order_id"))
-        
-        # Add CRM context information
-        summary_info["crm_context"].update({
-            "customer_tier": crm_info["tier"],
-            "entitlements": crm_info["entitlements"],
-            "shipping_constraints": crm_info["shipping_constraints"],
-            "customer_id": crm_info["customer_id"],
-        })
+        summary_info = t["ai_summary"]
+        crm_info = t["crm_profile"]
         
         thread_list.append({
             "thread_id": tid,
@@ -121,31 +348,23 @@ def api_threads():
 
 @app.get("/api/threads/<id>")
 def api_thread_detail(id: str):
-    raw = load_json(DATASET_PATH, default={"threads": []})
-    thread_raw = next((t for t in raw.get("threads", []) if t.get("thread_id") == id), None)
-    if not thread_raw:
+    thread = get_thread(id)
+    if not thread:
         return jsonify({"error": "Thread not found"}), 404
         
-    thread = normalize_thread(thread_raw)
-    crm_info = get_crm_profile(thread.get("order_id"))
+    crm_info = thread["crm_profile"]
     
     # Load playbooks mapping
     playbooks = load_json(PLAYBOOKS_PATH, default={})
     
-    # Run default rules summarizer
-    summary_info = rules_summarize(thread)
-    summary_info["crm_context"].update({
-        "customer_tier": crm_info["tier"],
-        "entitlements": crm_info["entitlements"],
-        "shipping_constraints": crm_info["shipping_constraints"],
-        "customer_id": crm_info["customer_id"],
-    })
+    # Default rules summary, already joined with CRM
+    summary_info = thread["ai_summary"]
     
     # Map intent to playbook actions
     intent = summary_info["intent"]
     actions = playbooks.get(intent, ["Send Template Reply", "Log Inquiry Note"])
     
-    approvals = load_json(APPROVED_SUMMARIES_PATH, default={})
+    approvals = _get_approvals()
     appr = approvals.get(id)
     
     # Format messages
@@ -187,30 +406,27 @@ def api_thread_detail(id: str):
 
 @app.post("/api/summarize")
 def api_summarize():
-    data = request.get_json(force=True)
+    data = _request_json()
     thread_id = data.get("thread_id")
     engine = data.get("engine", "rules")
     
-    raw = load_json(DATASET_PATH, default={"threads": []})
-    thread_raw = next((t for t in raw.get("threads", []) if t.get("thread_id") == thread_id), None)
-    if not thread_raw:
+    thread = get_thread(thread_id)
+    if not thread:
         return jsonify({"error": "Thread not found"}), 404
         
-    thread = normalize_thread(thread_raw)
-    
     if engine == "llm":
         summary_info = llm_summarize(thread)
+        # Inject CRM details
+        crm_info = thread["crm_profile"]
+        summary_info["crm_context"].update({
+            "customer_tier": crm_info["tier"],
+            "entitlements": crm_info["entitlements"],
+            "shipping_constraints": crm_info["shipping_constraints"],
+            "customer_id": crm_info["customer_id"],
+        })
     else:
-        summary_info = rules_summarize(thread)
-        
-    # Inject CRM details
-    crm_info = get_crm_profile(thread.get("order_id"))
-    summary_info["crm_context"].update({
-        "customer_tier": crm_info["tier"],
-        "entitlements": crm_info["entitlements"],
-        "shipping_constraints": crm_info["shipping_constraints"],
-        "customer_id": crm_info["customer_id"],
-    })
+        # Rules summary is precomputed and already joined with CRM
+        summary_info = thread["ai_summary"]
     
     return jsonify({
         "engine": engine,
@@ -225,7 +441,7 @@ def api_summarize():
 
 @app.post("/api/approve")
 def api_approve():
-    data = request.get_json(force=True)
+    data = _request_json()
     thread_id = data.get("thread_id")
     approved_summary = data.get("approved_summary")
     approver = data.get("approver") or "ce_associate"
@@ -235,9 +451,6 @@ def api_approve():
     if not thread_id or approved_summary is None:
         return jsonify({"error": "thread_id and approved_summary are required"}), 400
         
-    ensure_dirs()
-    approvals = load_json(APPROVED_SUMMARIES_PATH, default={})
-    
     approved_intent = infer_intent_from_text(approved_summary)
     approved_status = infer_status_from_text(approved_summary)
     
@@ -250,41 +463,18 @@ def api_approve():
         "engine_used": engine_used,
         "edit_distance": edit_distance
     }
-    approvals[thread_id] = record
-    save_json(APPROVED_SUMMARIES_PATH, approvals)
-    
-    # Denormalize and export
-    export_records = []
-    raw = load_json(DATASET_PATH, default={"threads": []})
-    threads = [normalize_thread(t) for t in raw.get("threads", [])]
-    for t in threads:
-        tid = t.get("thread_id")
-        appr = approvals.get(tid, {})
-        crm_info = get_crm_profile(t.get("order_id"))
-        rules_info = rules_summarize(t)
-        
-        rec = {
-            "thread_id": tid,
-            "order_id": t.get("order_id"),
-            "product": t.get("product"),
-            "intent": rules_info.get("intent"),
-            "status": rules_info.get("status"),
-            "approved_summary": appr.get("approved_summary"),
-            "approved_intent": appr.get("approved_intent"),
-            "approved_status": appr.get("approved_status"),
-            "customer_id": crm_info.get("customer_id"),
-            "customer_tier": crm_info.get("tier"),
-            "entitlements": crm_info.get("entitlements"),
-            "shipping_constraints": crm_info.get("shipping_constraints"),
-        }
-        export_records.append(rec)
-    save_json(EXPORT_PATH, export_records)
+    persist_approval(thread_id, record)
     
     return jsonify({"ok": True, "approval": record})
 
+@app.post("/admin/compact")
+def admin_compact():
+    approvals = compact_approvals()
+    return jsonify({"ok": True, "approvals": len(approvals)})
+
 @app.post("/api/trigger_action")
 def api_trigger_action():
-    data = request.get_json(force=True)
+    data = _request_json()
     action_type = data.get("action_type")
     thread_id = data.get("thread_id")
     
@@ -299,81 +489,68 @@ def api_trigger_action():
         "log_entry": log_entry
     })
 
+class _LineBuffer:
+    """File-like sink for csv.writer: writerow() hands back the formatted line."""
+    def write(self, line: str) -> str:
+        return line
+
 @app.get("/export/json")
 def export_json():
     ensure_dirs()
-    approvals = load_json(APPROVED_SUMMARIES_PATH, default={})
-    raw = load_json(DATASET_PATH, default={"threads": []})
-    threads = [normalize_thread(t) for t in raw.get("threads", [])]
+    approvals = _get_approvals()
+    threads = _get_threads()
+    refresh_export(threads, approvals)
     
-    export_records = []
-    for t in threads:
-        tid = t.get("thread_id")
-        ai = rules_summarize(t)
-        appr = approvals.get(tid, {})
-        export_records.append({
-            "thread_id": tid,
-            "order_id": t.get("order_id"),
-            "product": t.get("product"),
-            "intent": ai.get("intent"),
-            "status": ai.get("status"),
-            "approved_summary": appr.get("approved_summary"),
-            "approved_intent": appr.get("approved_intent"),
-            "approved_status": appr.get("approved_status"),
-            "engine_used": appr.get("engine_used"),
-            "edit_distance": appr.get("edit_distance")
-        })
-    payload = json.dumps(export_records, ensure_ascii=False, indent=2)
-    return Response(payload, mimetype="application/json",
+    def generate():
+        yield "["
+        for i, t in enumerate(threads):
+            tid = t.get("thread_id")
+            ai = t["ai_summary"]
+            appr = approvals.get(tid, {})
+            rec = {
+                "thread_id": tid,
+                "order_id": t.get("order_id"),
+                "product": t.get("product"),
+                "intent": ai.get("intent"),
+                "status": ai.get("status"),
+                "approved_summary": appr.get("approved_summary"),
+                "approved_intent": appr.get("approved_intent"),
+                "approved_status": appr.get("approved_status"),
+                "engine_used": appr.get("engine_used"),
+                "edit_distance": appr.get("edit_distance")
+            }
+            # Same layout as dumping the whole list with indent=2
+            body = ujson.dumps(rec, ensure_ascii=False, indent=2, escape_forward_slashes=False).replace("\n", "\n  ")
+            yield ("\n  " if i == 0 else ",\n  ") + body
+        yield "\n]" if threads else "]"
+    return Response(stream_with_context(generate()), mimetype="application/json",
                     headers={"Content-Disposition": "attachment; filename=approved_export.json"})
 
 @app.get("/export/csv")
 def export_csv():
     ensure_dirs()
-    approvals = load_json(APPROVED_SUMMARIES_PATH, default={})
-    raw = load_json(DATASET_PATH, default={"threads": []})
-    threads = [normalize_thread(t) for t in raw.get("threads", [])]
+    approvals = _get_approvals()
+    threads = _get_threads()
+    refresh_export(threads, approvals)
     
-    output = io.StringIO()
-    writer = csv.writer(output)
-    header = [
-        "thread_id", "order_id", "product",
-        "intent", "status", "approved_summary", "approved_intent", "approved_status",
-        "customer_id", "customer_tier", "entitlements", "shipping_constraints",
-        "engine_used", "edit_distance"
-    ]
-    writer.writerow(header)
-    for t in threads:
-        tid = t.get("thread_id")
-        ai = rules_summarize(t)
-        crm_info = get_crm_profile(t.get("order_id"))
-        appr = approvals.get(tid, {})
-        row = [
-            tid,
-            t.get("order_id"),
-            t.get("product"),
-            ai.get("intent"),
-            ai.get("status"),
-            (appr.get("approved_summary") or "").replace("\n", " ").strip(),
-            appr.get("approved_intent"),
-            appr.get("approved_status"),
-            crm_info.get("customer_id"),
-            crm_info.get("tier"),
-            ";".join(crm_info.get("entitlements", [])),
-            ";".join(crm_info.get("shipping_constraints", [])),
-            appr.get("engine_used", ""),
-            appr.get("edit_distance", "")
-        ]
-        writer.writerow(row)
-    data = output.getvalue()
-    return Response(data, mimetype="text/csv",
+    def generate():
+        writer = csv.writer(_LineBuffer())
+        yield writer.writerow(_CSV_HEADER)
+        for t in threads:
+            appr = approvals.get(t.get("thread_id"))
+            row = _csv_row(t, appr) if appr else t["_csv_row"]
+            yield writer.writerow(row)
+    return Response(stream_with_context(generate()), mimetype="text/csv",
                     headers={"Content-Disposition": "attachment; filename=approved_export.csv"})
 
+# Intents counted towards deflection, and statuses (lowercased) that count as resolved
+_DEFLECT_INTENTS = frozenset({"shipping_delay", "general_inquiry"})
+_RESOLVED_STATUSES = frozenset({"resolved/approved"})
+
 @app.get("/api/metrics")
 def api_metrics():
-    raw = load_json(DATASET_PATH, default={"threads": []})
-    threads = [normalize_thread(t) for t in raw.get("threads", [])]
-    approvals = load_json(APPROVED_SUMMARIES_PATH, default={})
+    threads = _get_threads()
+    approvals = _get_approvals()
     
     total = len(threads)
     approved_count = 0
@@ -381,22 +558,22 @@ def api_metrics():
     deflect_numer = 0
     deflect_denom = 0
     
+    appr_get = approvals.get
     for t in threads:
-        tid = t.get("thread_id")
-        appr = approvals.get(tid)
-        ai = rules_summarize(t)
-        
-        intent = ai.get("intent", "").lower()
+        ai = t["ai_summary"]
+        appr = appr_get(t.get("thread_id"))
+        approved_status = None
         if appr:
             approved_count += 1
-            if (appr.get("approved_status") or "").lower().startswith("resolved"):
+            approved_status = appr.get("approved_status")
+            if approved_status and approved_status.lower() in _RESOLVED_STATUSES:
                 resolved_count += 1
                 
         # Deflection rate calculation:
-        if intent in ("shipping_delay", "general_inquiry"):
+        if ai["intent"] in _DEFLECT_INTENTS:
             deflect_denom += 1
-            status = (appr.get("approved_status") or ai.get("status") or "").lower()
-            if status.startswith("resolved"):
+            status = approved_status or ai.get("status")
+            if status and status.lower() in _RESOLVED_STATUSES:
                 deflect_numer += 1
                 
     approval_rate = (approved_count / total) if total else 0.0
@@ -434,7 +611,7 @@ def api_set_key():
     and sets it in the current process environment so llm.py picks it up
     immediately without a server restart.
     """
-    data = request.get_json(force=True)
+    data = _request_json()
     key = (data.get("api_key") or "").strip()
 
     if not key:
@@ -3,7 +3,7 @@ import json
 from typing import Any, Dict, Optional
 from anthropic import Anthropic
 from summarizer.mock_responses import MOCK_LLM_RESPONSES
-from summarizer.rules import rules_summarize
+from summarizer.rules import SLA_HOURS, rules_summarize
 
 # Try to load from dotenv if it's installed
 try:
@@ -112,19 +112,10 @@ def format_llm_response(thread: Dict[str, Any], data: Dict[str, Any], is_mock: b
         f"**Key Entities:** Order #{order_id} | {amount} | Tracking: {tracking}"
     )
     
-    sla_hours_map = {
-        "refund_request": 24,
-        "replacement_order": 24,
-        "shipping_delay": 12,
-        "billing_dispute": 24,
-        "technical_issue": 24,
-        "general_inquiry": 24,
-    }
-    
     # Enrich CRM context (will be updated by crm.json join in app.py)
     crm_context = {
         "customer_tier": "Standard",
-        "sla_hours": sla_hours_map.get(intent, 24),
+        "sla_hours": SLA_HOURS.get(intent, 24),
         "entitlements": [],
         "shipping_constraints": [],
         "customer_id": None,
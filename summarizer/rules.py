@@ -1,53 +1,110 @@
 import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+# SLA based on intent
+SLA_HOURS = {
+    "refund_request": 24,
+    "replacement_order": 24,
+    "shipping_delay": 12,
+    "billing_dispute": 24,
+    "technical_issue": 24,
+    "general_inquiry": 24,
+}
+
+_NEXT_STEPS = {
+    "refund_request": "Initiate return validation; process Stripe refund if requirements met",
+    "replacement_order": "Create replacement order in CRM; generate shipping label",
+    "shipping_delay": "Request carrier tracking update; notify client of delivery window",
+    "billing_dispute": "Verify payment records; forward to billing department if needed",
+    "technical_issue": "Escalate technical details to Tier 2 support team",
+}
+_DEFAULT_NEXT_STEP = "Clarify customer requirements and reply within SLA"
+
+def _first_matching_group(groups, t: str, default: Any) -> Any:
+    # Plain substring checks in precedence order, stopping at the first hit
+    for label, keywords in groups:
+        for k in keywords:
+            if k in t:
+                return label
+    return default
+
+# Taxonomy: ["refund_request", "replacement_order", "shipping_delay", "billing_dispute", "technical_issue", "general_inquiry"]
+_INTENT_KEYWORDS = (
+    ("refund_request", ("refund", "return", "money back", "credit", "damaged", "broken", "defective")),
+    ("replacement_order", ("replace", "replacement", "exchange", "wrong", "color", "size", "variant")),
+    ("shipping_delay", ("late", "delayed", "where is", "tracking", "delivery", "shipment", "carrier", "stuck")),
+    ("billing_dispute", ("bill", "billing", "invoice", "charge", "charged", "payment", "dispute", "price")),
+    ("technical_issue", ("error", "fail", "failed", "bug", "glitch", "technical")),
+)
+
+_STATUS_KEYWORDS = (
+    ("Resolved/Approved", ("resolved", "approved", "approve", "done")),
+    ("Pending - Awaiting customer/company action", ("pending", "awaiting", "need", "confirm", "question")),
+    ("In progress", ("reroute", "replacement", "refund", "return", "processing")),
+)
+
+# Sentiment options: positive, neutral, negative, escalated
+_SENTIMENT_KEYWORDS = (
+    ("escalated", ("urgent", "escalate", "manager", "supervisor", "terrible", "awful", "fraud", "worst", "unacceptable")),
+    ("negative", ("delay", "broken", "wrong", "disappointed", "poor", "issue", "late", "slow", "sorry", "decline", "damaged", "defective")),
+    ("positive", ("thank", "thanks", "great", "good", "perfect", "happy", "appreciate", "love")),
+)
+
+def _infer_intent_lc(t: str) -> str:
+    return _first_matching_group(_INTENT_KEYWORDS, t, "general_inquiry")
 
 def infer_intent_from_text(text: str) -> str:
-    t = (text or "").lower()
-    # Taxonomy: ["refund_request", "replacement_order", "shipping_delay", "billing_dispute", "technical_issue", "general_inquiry"]
-    if any(k in t for k in ["refund", "return", "money back", "credit", "damaged", "broken", "defective"]):
-        return "refund_request"
-    if any(k in t for k in ["replace", "replacement", "exchange", "wrong", "color", "size", "variant"]):
-        return "replacement_order"
-    if any(k in t for k in ["late", "delayed", "where is", "tracking", "delivery", "shipment", "carrier", "stuck"]):
-        return "shipping_delay"
-    if any(k in t for k in ["bill", "billing", "invoice", "charge", "charged", "payment", "dispute", "price"]):
-        return "billing_dispute"
-    if any(k in t for k in ["error", "fail", "failed", "bug", "glitch", "technical"]):
-        return "technical_issue"
-    return "general_inquiry"
+    return _infer_intent_lc((text or "").lower())
+
+def _infer_sentiment_lc(t: str) -> str:
+    return _first_matching_group(_SENTIMENT_KEYWORDS, t, "neutral")
 
 def infer_sentiment_from_text(text: str) -> str:
-    t = (text or "").lower()
-    # Sentiment options: positive, neutral, negative, escalated
-    if any(k in t for k in ["urgent", "escalate", "manager", "supervisor", "terrible", "awful", "fraud", "worst", "unacceptable"]):
-        return "escalated"
-    if any(k in t for k in ["delay", "broken", "wrong", "disappointed", "poor", "issue", "late", "slow", "sorry", "decline", "damaged", "defective"]):
-        return "negative"
-    if any(k in t for k in ["thank", "thanks", "great", "good", "perfect", "happy", "appreciate", "love"]):
-        return "positive"
-    return "neutral"
+    return _infer_sentiment_lc((text or "").lower())
 
-def infer_requested_action_from_text(text: str) -> Optional[str]:
-    t = (text or "").lower()
+def _infer_requested_action_lc(t: str) -> Optional[str]:
     if "refund" in t:
         return "Refund"
-    if any(k in t for k in ["replace", "replacement"]):
+    if "replace" in t:
         return "Replacement"
     if "return" in t:
         return "Return"
-    if "address" in t and any(k in t for k in ["confirm", "confirmation"]):
+    if "address" in t and "confirm" in t:
         return "Confirm address"
     return None
 
+def infer_requested_action_from_text(text: str) -> Optional[str]:
+    return _infer_requested_action_lc((text or "").lower())
+
+def _infer_status_lc(t: str) -> str:
+    return _first_matching_group(_STATUS_KEYWORDS, t, "Open")
+
 def infer_status_from_text(text: str) -> str:
-    t = (text or "").lower()
-    if any(k in t for k in ["resolved", "approved", "approve", "done"]):
-        return "Resolved/Approved"
-    if any(k in t for k in ["pending", "awaiting", "need", "confirm", "question"]):
-        return "Pending - Awaiting customer/company action"
-    if any(k in t for k in ["reroute", "replacement", "refund", "return", "processing"]):
-        return "In progress"
-    return "Open"
+    return _infer_status_lc((text or "").lower())
+
+def _thread_text_lc(thread: Dict[str, Any]) -> Tuple[str, str, str]:
+    # Lowercased (all text, customer text, company text), bucketed by sender in one pass
+    bodies = [(thread.get("topic") or "").lower(), (thread.get("subject") or "").lower()]
+    customer: List[str] = []
+    company: List[str] = []
+    for m in thread.get("messages", []):
+        body = (m.get("body") or "").lower()
+        bodies.append(body)
+        sender = m.get("sender")
+        if sender == "customer":
+            customer.append(body)
+        elif sender == "company":
+            company.append(body)
+    return " ".join(bodies), " ".join(customer), " ".join(company)
+
+def precompute_thread_text(thread: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Stores the lowercased classification text on a freshly normalized thread
+    (``_all_lc``, ``_customer_lc``, ``_company_lc``) so rules_summarize doesn't redo it.
+    The thread must not be edited afterwards.
+    """
+    thread["_all_lc"], thread["_customer_lc"], thread["_company_lc"] = _thread_text_lc(thread)
+    return thread
 
 def extract_entities_from_text(text: str) -> Dict[str, List[str]]:
     # Simple regex extraction for Order IDs, tracking numbers, and amounts
@@ -69,48 +126,24 @@ def rules_summarize(thread: Dict[str, Any]) -> Dict[str, Any]:
     thread_id = thread.get("thread_id")
     order_id = thread.get("order_id") or ""
     product = thread.get("product") or "Unknown Product"
-    subject = thread.get("subject") or ""
-    topic = thread.get("topic") or ""
-    messages: List[Dict[str, Any]] = thread.get("messages", [])
 
-    # Concatenate message texts to infer fields
-    customer_messages = [m.get("body", "") for m in messages if m.get("sender") == "customer"]
-    company_messages = [m.get("body", "") for m in messages if m.get("sender") == "company"]
-    all_text = " ".join([topic, subject] + [m.get("body", "") for m in messages])
+    # Lowercased texts to infer fields; precomputed by normalize_thread, otherwise built locally
+    if "_all_lc" in thread:
+        all_text, customer_text, company_text = thread["_all_lc"], thread["_customer_lc"], thread["_company_lc"]
+    else:
+        all_text, customer_text, company_text = _thread_text_lc(thread)
 
-    intent = infer_intent_from_text(all_text)
-    sentiment = infer_sentiment_from_text(all_text)
-    requested_action = infer_requested_action_from_text(" ".join(customer_messages))
-    status = infer_status_from_text(" ".join(company_messages) if company_messages else "")
+    intent = _infer_intent_lc(all_text)
+    sentiment = _infer_sentiment_lc(all_text)
+    requested_action = _infer_requested_action_lc(customer_text)
+    status = _infer_status_lc(company_text)
 
     # Next steps suggestion
-    next_steps: List[str] = []
-    if intent == "refund_request":
-        next_steps.append("Initiate return validation; process Stripe refund if requirements met")
-    elif intent == "replacement_order":
-        next_steps.append("Create replacement order in CRM; generate shipping label")
-    elif intent == "shipping_delay":
-        next_steps.append("Request carrier tracking update; notify client of delivery window")
-    elif intent == "billing_dispute":
-        next_steps.append("Verify payment records; forward to billing department if needed")
-    elif intent == "technical_issue":
-        next_steps.append("Escalate technical details to Tier 2 support team")
-    else:
-        next_steps.append("Clarify customer requirements and reply within SLA")
-
-    # SLA based on intent
-    sla_hours_map = {
-        "refund_request": 24,
-        "replacement_order": 24,
-        "shipping_delay": 12,
-        "billing_dispute": 24,
-        "technical_issue": 24,
-        "general_inquiry": 24,
-    }
+    next_steps: List[str] = [_NEXT_STEPS.get(intent, _DEFAULT_NEXT_STEP)]
 
     crm_context = {
         "customer_tier": "Standard",
-        "sla_hours": sla_hours_map.get(intent, 24),
+        "sla_hours": SLA_HOURS.get(intent, 24),
         "entitlements": [],
         "shipping_constraints": [],
         "customer_id": None,
@@ -2,6 +2,9 @@ import os
 import sys
 import unittest
 import json
+import csv
+import io
+from unittest import mock
 
 # Ensure import path includes project root
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -9,7 +12,8 @@ PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-from app import app, APPROVED_SUMMARIES_PATH
+import app as app_module
+from app import app, APPROVED_SUMMARIES_PATH, APPROVALS_LOG_PATH, APPROVALS_COMPACTING_PATH, EXPORT_PATH, load_approvals, load_threads_with_summaries
 
 
 class TestRoutes(unittest.TestCase):
@@ -17,17 +21,18 @@ class TestRoutes(unittest.TestCase):
         self.app = app.test_client()
         self.app.testing = True
 
-        # Backup existing approved summaries if any
-        self.backup_path = APPROVED_SUMMARIES_PATH + ".bak"
-        if os.path.exists(APPROVED_SUMMARIES_PATH):
-            os.rename(APPROVED_SUMMARIES_PATH, self.backup_path)
+        # Backup existing approved summaries, approvals log and export if any
+        for path in (APPROVED_SUMMARIES_PATH, APPROVALS_LOG_PATH, APPROVALS_COMPACTING_PATH, EXPORT_PATH):
+            if os.path.exists(path):
+                os.rename(path, path + ".bak")
 
     def tearDown(self):
-        # Remove test approvals and restore backup
-        if os.path.exists(APPROVED_SUMMARIES_PATH):
-            os.remove(APPROVED_SUMMARIES_PATH)
-        if os.path.exists(self.backup_path):
-            os.rename(self.backup_path, APPROVED_SUMMARIES_PATH)
+        # Remove test approvals and restore backups
+        for path in (APPROVED_SUMMARIES_PATH, APPROVALS_LOG_PATH, APPROVALS_COMPACTING_PATH, EXPORT_PATH):
+            if os.path.exists(path):
+                os.remove(path)
+            if os.path.exists(path + ".bak"):
+                os.rename(path + ".bak", path)
 
     def test_api_threads(self):
         response = self.app.get('/api/threads')
@@ -43,6 +48,13 @@ class TestRoutes(unittest.TestCase):
         self.assertIn("intent", t)
         self.assertIn("sentiment", t)
 
+    def test_threads_cache_reused(self):
+        # Unchanged dataset/CRM files should not trigger a rebuild
+        first = load_threads_with_summaries()
+        self.assertIs(first, load_threads_with_summaries())
+        self.assertIn("ai_summary", first[0])
+        self.assertIn("crm_profile", first[0])
+
     def test_api_thread_detail(self):
         # Successful retrieve
         response = self.app.get('/api/threads/CE-405467-683')
@@ -69,6 +81,35 @@ class TestRoutes(unittest.TestCase):
         self.assertIn("intent", data)
         self.assertIn("sentiment", data)
 
+    def test_api_summarize_invalid_thread_id(self):
+        for thread_id in (["x"], {"id": 1}, None, "CE-INVALID-ID"):
+            response = self.app.post('/api/summarize',
+                                     data=json.dumps({"thread_id": thread_id}),
+                                     content_type='application/json')
+            self.assertEqual(response.status_code, 404)
+
+    def test_get_thread_first_duplicate_wins(self):
+        first = app_module._summarize_one({"thread_id": "DUP", "topic": "first", "messages": []})
+        second = app_module._summarize_one({"thread_id": "DUP", "topic": "second", "messages": []})
+        with mock.patch.object(app_module, "_threads_with_summaries", return_value=[first, second]):
+            app_module._threads_by_id.cache_clear()
+            try:
+                self.assertIs(app_module.get_thread("DUP"), first)
+            finally:
+                app_module._threads_by_id.cache_clear()
+
+    def test_normalize_thread_uses_current_timestamps(self):
+        raw = {"thread_id": "T", "messages": [
+            {"id": "a", "timestamp": "2024-01-01T10:00:00Z"},
+            {"id": "b", "timestamp": "2024-01-01T11:00:00Z"},
+        ]}
+        first = app_module.normalize_thread(raw)
+        self.assertEqual([m["id"] for m in first["messages"]], ["a", "b"])
+        self.assertNotIn("_ts", raw["messages"][0])
+        raw["messages"][0]["timestamp"] = "2024-01-01T12:00:00Z"
+        second = app_module.normalize_thread(raw)
+        self.assertEqual([m["id"] for m in second["messages"]], ["b", "a"])
+
     def test_api_approve(self):
         payload = {
             "thread_id": "CE-405467-683",
@@ -86,13 +127,56 @@ class TestRoutes(unittest.TestCase):
         self.assertEqual(data["approval"]["approved_summary"], "Test approved text")
         self.assertEqual(data["approval"]["approver"], "tester")
 
-        # Verify it saved to approved_summaries.json
+        # Approvals are appended to the log and visible straight away
+        self.assertTrue(os.path.exists(APPROVALS_LOG_PATH))
+        self.assertEqual(load_approvals()["CE-405467-683"]["approved_summary"], "Test approved text")
+
+        # Compaction folds the log into approved_summaries.json
+        response = self.app.post('/admin/compact')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(os.path.exists(APPROVALS_LOG_PATH))
         self.assertTrue(os.path.exists(APPROVED_SUMMARIES_PATH))
         with open(APPROVED_SUMMARIES_PATH, 'r') as f:
             saved = json.load(f)
             self.assertIn("CE-405467-683", saved)
             self.assertEqual(saved["CE-405467-683"]["approved_summary"], "Test approved text")
 
+    def test_export_file_refreshed_on_request(self):
+        payload = {"thread_id": "CE-405467-683", "approved_summary": "Export refresh text"}
+        self.app.post('/api/approve', data=json.dumps(payload), content_type='application/json')
+
+        self.assertEqual(self.app.get('/export/json').status_code, 200)
+        with open(EXPORT_PATH, 'r') as f:
+            rows = {r["thread_id"]: r for r in json.load(f)}
+        self.assertEqual(rows["CE-405467-683"]["approved_summary"], "Export refresh text")
+
+    def test_compact_folds_leftover_log(self):
+        # A log moved aside by an interrupted compaction is still visible and gets folded
+        with open(APPROVALS_COMPACTING_PATH, 'w') as f:
+            f.write(json.dumps({"thread_id": "CE-405467-683", "approval": {"approved_summary": "older"}}) + "\n")
+        payload = {"thread_id": "CE-928163-566", "approved_summary": "newer"}
+        self.app.post('/api/approve', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(set(load_approvals()), {"CE-405467-683", "CE-928163-566"})
+
+        self.app.post('/admin/compact')
+        self.assertFalse(os.path.exists(APPROVALS_COMPACTING_PATH))
+        with open(APPROVED_SUMMARIES_PATH, 'r') as f:
+            self.assertIn("CE-405467-683", json.load(f))
+        # The live log waits for the next compaction
+        self.assertEqual(set(load_approvals()), {"CE-405467-683", "CE-928163-566"})
+        self.app.post('/admin/compact')
+        self.assertFalse(os.path.exists(APPROVALS_LOG_PATH))
+        with open(APPROVED_SUMMARIES_PATH, 'r') as f:
+            self.assertEqual(set(json.load(f)), {"CE-405467-683", "CE-928163-566"})
+
+    def test_save_json_failure_keeps_previous_file(self):
+        app_module.save_json(APPROVED_SUMMARIES_PATH, {"CE-405467-683": {"approved_summary": "kept"}})
+        with self.assertRaises(TypeError):
+            app_module.save_json(APPROVED_SUMMARIES_PATH, {"CE-405467-683": object()})
+        with open(APPROVED_SUMMARIES_PATH, 'r') as f:
+            self.assertEqual(json.load(f)["CE-405467-683"]["approved_summary"], "kept")
+        self.assertEqual([n for n in os.listdir(app_module.DATA_DIR) if n.startswith(".tmp-")], [])
+
     def test_api_trigger_action(self):
         payload = {
             "action_type": "Issue Refund (Stripe mock)",
@@ -122,6 +206,65 @@ class TestRoutes(unittest.TestCase):
         self.assertEqual(data["approved_count"], 1)
         self.assertGreater(data["approval_rate"], 0.0)
 
+    def test_api_metrics_unapproved_deflection_thread(self):
+        # Unapproved shipping_delay thread used to crash the deflection calculation
+        thread = app_module._summarize_one({
+            "thread_id": "T-DEFLECT",
+            "topic": "Where is my package",
+            "subject": "Shipment delayed",
+            "messages": [
+                {"id": "m1", "sender": "customer", "timestamp": "2025-01-01T00:00:00", "body": "where is my tracking update"},
+            ],
+        })
+        self.assertEqual(thread["ai_summary"]["intent"], "shipping_delay")
+        with mock.patch.object(app_module, "load_threads_with_summaries", return_value=[thread]):
+            response = self.app.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data["total_threads"], 1)
+        self.assertEqual(data["approved_count"], 0)
+        self.assertEqual(data["deflection_rate"], 0.0)
+
+    def test_export_json(self):
+        response = self.app.get('/export/json')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(len(data), len(load_threads_with_summaries()))
+        self.assertIn("approved_summary", data[0])
+
+    def test_export_csv(self):
+        response = self.app.get('/export/csv')
+        self.assertEqual(response.status_code, 200)
+        lines = response.data.decode("utf-8").splitlines()
+        self.assertTrue(lines[0].startswith("thread_id,order_id,product"))
+        self.assertEqual(len(lines) - 1, len(load_threads_with_summaries()))
+
+    def test_export_csv_approved_row(self):
+        payload = {
+            "thread_id": "CE-405467-683",
+            "approved_summary": "Refund approved\nand resolved",
+            "approver": "tester",
+            "engine_used": "llm",
+            "edit_distance": 7
+        }
+        self.app.post('/api/approve', data=json.dumps(payload), content_type='application/json')
+
+        response = self.app.get('/export/csv')
+        rows = list(csv.DictReader(io.StringIO(response.data.decode("utf-8"))))
+        row = next(r for r in rows if r["thread_id"] == "CE-405467-683")
+        self.assertEqual(row["approved_summary"], "Refund approved and resolved")
+        self.assertEqual(row["approved_intent"], "refund_request")
+        self.assertEqual(row["approved_status"], "Resolved/Approved")
+        self.assertEqual(row["engine_used"], "llm")
+        self.assertEqual(row["edit_distance"], "7")
+        # CRM columns around the approval columns are kept
+        self.assertEqual(row["customer_id"], "C-1001")
+        self.assertEqual(row["entitlements"], "30-day-returns")
+
+        other = next(r for r in rows if r["thread_id"] != "CE-405467-683")
+        self.assertEqual(other["approved_summary"], "")
+        self.assertEqual(other["engine_used"], "")
+
 
 if __name__ == "__main__":
     unittest.main()
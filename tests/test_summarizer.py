@@ -56,6 +56,24 @@ class TestSummarizer(unittest.TestCase):
         self.assertIn("Intent:", s["summary_markdown"])
         self.assertIn("Customer Sentiment:", s["summary_markdown"])
 
+    def test_rules_summary_does_not_cache_on_input(self):
+        thread = {
+            "thread_id": "X-2",
+            "topic": "Question",
+            "subject": "Order X-2",
+            "messages": [
+                {"id": "m1", "sender": "customer", "timestamp": "2025-01-01T00:00:00", "body": "where is my tracking"},
+            ],
+        }
+        self.assertEqual(rules_summarize(thread)["intent"], "shipping_delay")
+        self.assertNotIn("_all_lc", thread)
+
+        # Edits made between calls must be picked up
+        thread["messages"][0]["body"] = "please refund me"
+        self.assertEqual(rules_summarize(thread)["intent"], "refund_request")
+        thread["messages"].append({"id": "m2", "sender": "company", "timestamp": "2025-01-01T00:10:00", "body": "approved"})
+        self.assertEqual(rules_summarize(thread)["status"], "Resolved/Approved")
+
     def test_llm_fallback_summary(self):
         thread = {
             "thread_id": "CE-405467-683",